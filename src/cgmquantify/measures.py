@@ -2,6 +2,189 @@ import pandas as pd
 import numpy as np
 from scipy import stats
 
+# Average readings per subject above which partitioning beat the single lexsort in local timings
+# (about 3x faster at 200 subjects x 20k readings, 2x slower at 5000 subjects x 100 readings)
+_PARTITION_MIN_GROUP_SIZE = 256
+
+class _Groups:
+    """
+    Factorized subject IDs of a DataFrame, computed once per measure call by _get_groups.
+
+    Rows with a missing 'id' are left out, as groupby does; codes and the block layout refer to
+    the remaining rows, which select() picks out of any per-row array.
+
+    Attributes:
+        valid (np.ndarray): Boolean mask of the rows with an 'id', or None if every row has one.
+        codes (np.ndarray): Integer subject code of each row with an 'id'.
+        uniques: The unique subject IDs, in order of first appearance.
+        order (np.ndarray): Row order that makes each subject a contiguous block, or None if it already is.
+        starts (np.ndarray): Offset of each subject's block in that order.
+        sizes (np.ndarray): Number of rows of each subject.
+    """
+    __slots__ = ("valid", "codes", "uniques", "order", "starts", "sizes")
+
+    def __init__(self, valid, codes, uniques, order, starts, sizes):
+        self.valid = valid
+        self.codes = codes
+        self.uniques = uniques
+        self.order = order
+        self.starts = starts
+        self.sizes = sizes
+
+    def select(self, values: np.ndarray) -> np.ndarray:
+        """
+        Keep the entries of a per-row array that belong to rows with an 'id'.
+
+        Args:
+            values (np.ndarray): Array with one entry per row of the DataFrame.
+
+        Returns:
+            np.ndarray: The entries aligned with codes.
+        """
+        return values if self.valid is None else values[self.valid]
+
+def _get_groups(df: pd.DataFrame) -> _Groups:
+    """
+    Factorize the subject IDs of a DataFrame so that several helpers can share one grouping.
+
+    Args:
+        df (pd.DataFrame): DataFrame with an 'id' column (subject ID).
+
+    Returns:
+        _Groups: The subject codes, unique IDs and contiguous-block layout.
+    """
+    # Missing IDs get code -1; drop those rows as groupby does
+    codes, uniques = pd.factorize(df["id"], sort=False)
+    valid = None
+    if (codes < 0).any():
+        valid = codes >= 0
+        codes = codes[valid]
+    order = np.argsort(codes, kind="stable") if (np.diff(codes) < 0).any() else None
+    sizes = np.bincount(codes, minlength=len(uniques))
+    return _Groups(valid, codes, uniques, order, np.cumsum(sizes) - sizes, sizes)
+
+def _sorted_quantiles(df: pd.DataFrame, groups: _Groups, probs) -> tuple:
+    """
+    Compute several quantiles of glucose values for each subject with a single sort.
+
+    Args:
+        df (pd.DataFrame): DataFrame with 'id' and 'gl' columns (subject ID and glucose values).
+        groups (_Groups): The factorized subject IDs of df, from _get_groups.
+        probs (list): Probabilities in [0, 1] of the quantiles to compute.
+
+    Returns:
+        tuple: The unique subject IDs and an array with one row per subject and one column per quantile.
+    """
+    codes, uniques, starts = groups.codes, groups.uniques, groups.starts
+    gl = groups.select(df["gl"].to_numpy(dtype=float))
+    probs = np.asarray(probs, dtype=float)
+
+    # Sort by subject, then glucose; NaNs end up at the tail of each subject's block
+    order = np.lexsort((gl, codes))
+    gl_sorted = gl[order]
+    n_valid = np.bincount(codes, weights=~np.isnan(gl), minlength=len(uniques)).astype(np.intp)
+
+    # Linearly interpolate between the order statistics around q*(n-1)
+    pos = probs[None, :] * np.maximum(n_valid - 1, 0)[:, None]
+    lo = np.floor(pos).astype(np.intp)
+    hi = np.minimum(lo + 1, np.maximum(n_valid - 1, 0)[:, None])
+    frac = pos - lo
+    below = gl_sorted[starts[:, None] + lo]
+    above = gl_sorted[starts[:, None] + hi]
+    values = below + (above - below) * frac
+    values[n_valid == 0] = np.nan
+
+    return uniques, values
+
+def _partitioned_quantiles(df: pd.DataFrame, groups: _Groups, probs) -> tuple:
+    """
+    Compute several quantiles of glucose values for each subject with one partition per subject.
+
+    Args:
+        df (pd.DataFrame): DataFrame with 'id' and 'gl' columns (subject ID and glucose values).
+        groups (_Groups): The factorized subject IDs of df, from _get_groups.
+        probs (list): Probabilities in [0, 1] of the quantiles to compute.
+
+    Returns:
+        tuple: The unique subject IDs and an array with one row per subject and one column per quantile.
+    """
+    gl = groups.select(df["gl"].to_numpy(dtype=float))
+    probs = np.asarray(probs, dtype=float)
+
+    # Make each subject a contiguous block, which exports usually are already
+    if groups.order is not None:
+        gl = gl[groups.order]
+
+    # Only the order statistics around q*(n-1) are needed, so partition instead of sorting
+    values = np.full((len(groups.uniques), len(probs)), np.nan)
+    for i, (start, end) in enumerate(zip(groups.starts, groups.starts + groups.sizes)):
+        x = gl[start:end]
+        x = x[~np.isnan(x)]
+        if len(x) == 0:
+            continue
+        pos = probs * (len(x) - 1)
+        lo = np.floor(pos).astype(np.intp)
+        hi = np.minimum(lo + 1, len(x) - 1)
+        x = np.partition(x, np.unique(np.r_[lo, hi]))
+        values[i] = x[lo] + (x[hi] - x[lo]) * (pos - lo)
+
+    return groups.uniques, values
+
+def _grouped_quantiles(df: pd.DataFrame, groups: _Groups, probs) -> tuple:
+    """
+    Compute several quantiles of glucose values for each subject, choosing the faster strategy.
+
+    Partitioning each subject separately is linear per subject but pays a Python-level step per
+    subject, so it is only used when subjects average at least _PARTITION_MIN_GROUP_SIZE readings,
+    the measured crossover point between the two strategies.
+
+    Args:
+        df (pd.DataFrame): DataFrame with 'id' and 'gl' columns (subject ID and glucose values).
+        groups (_Groups): The factorized subject IDs of df, from _get_groups.
+        probs (list): Probabilities in [0, 1] of the quantiles to compute.
+
+    Returns:
+        tuple: The unique subject IDs and an array with one row per subject and one column per quantile.
+    """
+    if len(groups.codes) >= _PARTITION_MIN_GROUP_SIZE * len(groups.uniques):
+        return _partitioned_quantiles(df, groups, probs)
+    return _sorted_quantiles(df, groups, probs)
+
+def _percent_above(df: pd.DataFrame, groups: _Groups, targets_above) -> tuple:
+    """
+    Compute the percentage of glucose values above several thresholds for each subject in one pass.
+
+    Args:
+        df (pd.DataFrame): DataFrame with 'id' and 'gl' columns (subject ID and glucose values).
+        groups (_Groups): The factorized subject IDs of df, from _get_groups.
+        targets_above (list): List of threshold values to compare glucose levels.
+
+    Returns:
+        tuple: The unique subject IDs and an array with one row per subject and one column per threshold.
+    """
+    codes, uniques, sizes = groups.codes, groups.uniques, groups.sizes
+    gl_col = df["gl"]
+    gl = groups.select(gl_col.to_numpy(dtype=float, na_value=np.nan))
+    thresholds = np.asarray(targets_above, dtype=float)
+    n_groups, k = len(uniques), len(thresholds)
+
+    # Rank each value by how many thresholds it exceeds; NaNs exceed none
+    threshold_order = np.argsort(thresholds, kind="stable")
+    ranks = np.searchsorted(thresholds[threshold_order], gl, side="left")
+    ranks[np.isnan(gl)] = 0
+
+    # Count values per (subject, rank) in one pass, then accumulate from the top rank down
+    by_rank = np.bincount(codes * (k + 1) + ranks, minlength=n_groups * (k + 1)).reshape(n_groups, k + 1)
+    counts = np.cumsum(by_rank[:, ::-1], axis=1)[:, ::-1][:, 1:]
+    # Nullable dtypes skip pd.NA in the comparison, so only present values count towards the total
+    if pd.api.types.is_extension_array_dtype(gl_col.dtype):
+        sizes = np.bincount(codes, weights=groups.select(gl_col.notna().to_numpy()), minlength=n_groups)
+    percents = np.empty((n_groups, k))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        percents[:, threshold_order] = counts / sizes[:, None] * 100
+
+    return uniques, percents
+
 def above_percent(df: pd.DataFrame, targets_above=[140, 180, 250]) -> pd.DataFrame:
     """
     Compute the percentage of glucose values above given thresholds for each subject.
@@ -12,23 +195,19 @@ def above_percent(df: pd.DataFrame, targets_above=[140, 180, 250]) -> pd.DataFra
 
     Returns:
         pd.DataFrame: A DataFrame with one row per subject, each threshold as a separate column.
+            Missing NaN readings count towards each subject's total as values not above any
+            threshold; pd.NA readings in nullable columns are left out of the total.
     """
     if not {"id", "gl"}.issubset(df.columns):
         raise ValueError("DataFrame must contain 'id' and 'gl' columns.")
 
     # Compute the percentage of values above each threshold for each subject
-    result = (
-        df.groupby("id")["gl"]
-        .agg(
-            lambda group: {
-                f"above_{t}": (group > t).mean() * 100 for t in targets_above
-            }
-        )
-        .apply(pd.Series)
-        .reset_index()
-    )
+    uniques, percents = _percent_above(df, _get_groups(df), targets_above)
+
+    result = pd.DataFrame(percents, columns=[f"above_{t}" for t in targets_above])
+    result.insert(0, "id", uniques)
 
-    return result  # Correctly formatted wide-format DataFrame
+    return result.sort_values("id", ignore_index=True)  # Correctly formatted wide-format DataFrame
 
 def cv_glu(df: pd.DataFrame) -> pd.DataFrame:
     """
@@ -43,17 +222,15 @@ def cv_glu(df: pd.DataFrame) -> pd.DataFrame:
     if not {"id", "gl"}.issubset(df.columns):
         raise ValueError("DataFrame must contain 'id' and 'gl' columns.")
 
-    # Compute the percentage of values above each threshold for each subject
+    # Compute the coefficient of variation for each subject
+    g = df.groupby("id", sort=False, observed=True)["gl"]
     result = (
-        df.groupby("id")["gl"]
-        .agg(
-            lambda x: {f"CV": (np.std(x)/np.nanmean(x))*100}
-        )
-        .apply(pd.Series)
+        (g.std(ddof=0) / g.mean() * 100)
+        .rename("CV")
         .reset_index()
     )
 
-    return result  # Correctly formatted wide-format DataFrame
+    return result.sort_values("id", ignore_index=True)  # Correctly formatted wide-format DataFrame
 
 def sd_glu(df: pd.DataFrame) -> pd.DataFrame:
     """
@@ -68,24 +245,24 @@ def sd_glu(df: pd.DataFrame) -> pd.DataFrame:
     if not {"id", "gl"}.issubset(df.columns):
         raise ValueError("DataFrame must contain 'id' and 'gl' columns.")
 
-    # Group by 'id' and compute range for each subject
+    # Compute the standard deviation for each subject
     result = (
-        df.groupby("id")["gl"]
-        .agg(
-            lambda x: {f"SD": np.std(x)}
-        )
-        .apply(pd.Series)
+        df.groupby("id", sort=False, observed=True)["gl"]
+        .std(ddof=0)
+        .rename("SD")
         .reset_index()
     )
 
-    return result
+    return result.sort_values("id", ignore_index=True)
 
-def mad_glu(df: pd.DataFrame) -> pd.DataFrame:
+def mad_glu(df: pd.DataFrame, scale='normal') -> pd.DataFrame:
     """
     Compute the median absolute deviation (MAD) of glucose values for each subject.
 
     Args:
         df (pd.DataFrame): DataFrame with 'id' and 'gl' columns (subject ID and glucose values).
+        scale (str or float): The value the MAD is divided by, as in scipy.stats.median_abs_deviation.
+            The default 'normal' makes the MAD a consistent estimator of the standard deviation.
 
     Returns:
         pd.DataFrame: A DataFrame with one row per subject.
@@ -93,17 +270,21 @@ def mad_glu(df: pd.DataFrame) -> pd.DataFrame:
     if not {"id", "gl"}.issubset(df.columns):
         raise ValueError("DataFrame must contain 'id' and 'gl' columns.")
 
+    if isinstance(scale, str):
+        if scale.lower() != 'normal':
+            raise ValueError(f"{scale} is not a valid scale value.")
+        scale = stats.norm.ppf(0.75)
+
     # Compute the median absolute deviation with scaling for each subject.
+    g = df.groupby("id", sort=False, observed=True)["gl"]
+    deviations = (df["gl"] - g.transform("median")).abs()
     result = (
-        df.groupby("id")["gl"]
-        .agg(
-            lambda x: {f"MAD": stats.median_abs_deviation(x, scale = 'normal', nan_policy='omit')}
-        )
-        .apply(pd.Series)
+        (deviations.groupby(df["id"], sort=False, observed=True).median() / scale)
+        .rename("MAD")
         .reset_index()
     )
 
-    return result
+    return result.sort_values("id", ignore_index=True)
 
 def iqr_glu(df: pd.DataFrame) -> pd.DataFrame:
     """
@@ -118,18 +299,11 @@ def iqr_glu(df: pd.DataFrame) -> pd.DataFrame:
     if not {"id", "gl"}.issubset(df.columns):
         raise ValueError("DataFrame must contain 'id' and 'gl' columns.")
 
-    # Group by 'id' and compute range for each subject
-
-    result = (
-        df.groupby("id")["gl"]
-        .agg(
-            lambda x: {f"IQR": np.nanquantile(x,0.75)-np.nanquantile(x,0.25)}
-        )
-        .apply(pd.Series)
-        .reset_index()
-    )
+    # Compute the 25th and 75th percentiles for each subject
+    uniques, q = _grouped_quantiles(df, _get_groups(df), [0.25, 0.75])
+    result = pd.DataFrame({"id": uniques, "IQR": q[:, 1] - q[:, 0]})
 
-    return result
+    return result.sort_values("id", ignore_index=True)
 
 def range_glu(df: pd.DataFrame) -> pd.DataFrame:
     """
@@ -145,17 +319,10 @@ def range_glu(df: pd.DataFrame) -> pd.DataFrame:
         raise ValueError("DataFrame must contain 'id' and 'gl' columns.")
 
     # Group by 'id' and compute range for each subject
+    extremes = df.groupby("id", sort=False, observed=True)["gl"].agg(["max", "min"])
+    result = (extremes["max"] - extremes["min"]).rename("range").reset_index()
 
-    result = (
-        df.groupby("id")["gl"]
-        .agg(
-            lambda x: {f"range": np.nanmax(x)-np.nanmin(x)}
-        )
-        .apply(pd.Series)
-        .reset_index()
-    )
-
-    return result
+    return result.sort_values("id", ignore_index=True)
 
 def quantile_glu(df: pd.DataFrame, quantiles=[0, 25, 50, 75, 100]) -> pd.DataFrame:
     """
@@ -171,18 +338,10 @@ def quantile_glu(df: pd.DataFrame, quantiles=[0, 25, 50, 75, 100]) -> pd.DataFra
         raise ValueError("DataFrame must contain 'id' and 'gl' columns.")
 
     # Compute the quantile values for each subject
-    result = (
-        df.groupby("id")["gl"]
-        .agg(
-            lambda x: {
-                f"X{t}": np.nanquantile(x,t/100) for t in quantiles
-            }
-        )
-        .apply(pd.Series)
-        .reset_index()
-    )
-    print(result)
-    return result  # Correctly formatted wide-format DataFrame
+    uniques, q = _grouped_quantiles(df, _get_groups(df), [t / 100 for t in quantiles])
+    result = pd.DataFrame(q, columns=[f"X{t}" for t in quantiles])
+    result.insert(0, "id", uniques)
+    return result.sort_values("id", ignore_index=True)  # Correctly formatted wide-format DataFrame
 
 
 def j_index(df: pd.DataFrame) -> pd.DataFrame:
@@ -201,16 +360,67 @@ def j_index(df: pd.DataFrame) -> pd.DataFrame:
     if not {"id", "gl"}.issubset(df.columns):
         raise ValueError("DataFrame must contain 'id' and 'gl' columns.")
 
-    # Compute the percentage of values above each threshold for each subject
+    # Compute the j_index from the mean and standard deviation for each subject
+    g = df.groupby("id", sort=False, observed=True)["gl"]
     result = (
-        df.groupby("id")["gl"]
-        .agg(
-            lambda x: {f"J_index": 0.001*(np.nanmean(x)+np.std(x))**2}
-        )
-        .apply(pd.Series)
+        (0.001 * (g.mean() + g.std(ddof=0)) ** 2)
+        .rename("J_index")
         .reset_index()
     )
 
-    return result  # Correctly formatted wide-format DataFrame
+    return result.sort_values("id", ignore_index=True)  # Correctly formatted wide-format DataFrame
+
 
+def summary(df: pd.DataFrame, targets_above=[140, 180, 250], quantiles=[0, 25, 50, 75, 100]) -> pd.DataFrame:
+    """
+    Compute the summary measures (SD, CV, range, IQR, J_index, percentages above thresholds
+    and quantiles) for each subject, sharing a single grouping of the data.
+
+    Args:
+        df (pd.DataFrame): DataFrame with 'id' and 'gl' columns (subject ID and glucose values).
+        targets_above (list): List of threshold values to compare glucose levels.
+        quantiles (list): List of quantiles (in percent) to compute.
+
+    Returns:
+        pd.DataFrame: A DataFrame with one row per subject, each measure as a separate column.
+    """
+    if not {"id", "gl"}.issubset(df.columns):
+        raise ValueError("DataFrame must contain 'id' and 'gl' columns.")
+
+    groups = _get_groups(df)
+    codes, n_groups = groups.codes, len(groups.uniques)
+    gl = groups.select(df["gl"].to_numpy(dtype=float))
+    present = ~np.isnan(gl)
+
+    # Moments and extremes per subject from the shared codes, skipping missing values
+    n = np.bincount(codes, weights=present, minlength=n_groups)
+    lowest = np.full(n_groups, np.inf)
+    highest = np.full(n_groups, -np.inf)
+    np.fmin.at(lowest, codes, gl)
+    np.fmax.at(highest, codes, gl)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = np.bincount(codes, weights=np.where(present, gl, 0.0), minlength=n_groups) / n
+        deviations = np.where(present, gl - mean[codes], 0.0)
+        sd = np.sqrt(np.bincount(codes, weights=deviations ** 2, minlength=n_groups) / n)
+        glu_range = np.where(n > 0, highest - lowest, np.nan)
+
+    uniques, q = _grouped_quantiles(df, groups, [0.25, 0.75] + [t / 100 for t in quantiles])
+    _, percents = _percent_above(df, groups, targets_above)
+
+    result = pd.concat(
+        [
+            pd.DataFrame({
+                "id": uniques,
+                "SD": sd,
+                "CV": sd / mean * 100,
+                "range": glu_range,
+                "IQR": q[:, 1] - q[:, 0],
+                "J_index": 0.001 * (mean + sd) ** 2,
+            }),
+            pd.DataFrame(percents, columns=[f"above_{t}" for t in targets_above]),
+            pd.DataFrame(q[:, 2:], columns=[f"X{t}" for t in quantiles]),
+        ],
+        axis=1,
+    )
 
+    return result.sort_values("id", ignore_index=True)
@@ -1,7 +1,10 @@
+import logging
 import pandas as pd
 import numpy as np
 from typing import Tuple
 
+logger = logging.getLogger(__name__)
+
 def cgms2daybyday(df: pd.DataFrame, dt0=None, inter_gap=45, tz="UTC")->Tuple[np.ndarray, np.ndarray, float]:
     """
         Interpolate glucose values on an equally spaced grid from day to day
@@ -23,50 +26,78 @@ def cgms2daybyday(df: pd.DataFrame, dt0=None, inter_gap=45, tz="UTC")->Tuple[np.
                     3) Time frequency of the resulting grid, in minutes
         """
 
+    if dt0 is not None:
+        try:
+            is_positive = float(dt0) > 0
+        except (TypeError, ValueError):
+            is_positive = False
+        if not is_positive:
+            raise ValueError(f"dt0 must be a positive number of minutes, got {dt0!r}.")
+
     # Check if the date-time format is correct
     if not pd.api.types.is_datetime64_any_dtype(df['time']):
-        df['time'] = pd.to_datetime(df['time'], format='%Y-%m-%d %H:%M:%S', errors='coerce', utc=True)
+        parsed = pd.to_datetime(df['time'], format='%Y-%m-%d %H:%M:%S', errors='coerce', utc=True)
+        # Fall back to general ISO 8601 parsing (e.g. 'T' separators, fractional seconds) if nothing matched
+        if parsed.isna().all() and df['time'].notna().any():
+            parsed = pd.to_datetime(df['time'], format='ISO8601', errors='coerce', utc=True)
+        df['time'] = parsed
         if tz != "":
             df['time'] = df['time'].dt.tz_convert(tz)
     df = df.dropna(subset=['time', 'gl'])
 
     # Check that only one subject is in the data frame. If more than one subject, the first subject will be used.
-    if df['id'].nunique() > 1:
-        first_id = df['id'].unique()[0]
-        print(f"The data frame contains more than one subject ID. Only subject {first_id} was used.")
-        df = df[df['id']==first_id]
-
-    g = df['gl'].astype(float).values
-    tr = pd.to_datetime(df['time'].values)
+    # Compare against the first ID instead of hashing the column; single-subject data is not copied
+    # Missing IDs are not counted as another subject, as with nunique()
+    ids = df['id'].to_numpy()
+    missing = pd.isna(ids)
+    present = np.flatnonzero(~missing)
+    if len(present) > 0:
+        first_id = ids[present[0]]
+        is_first = ids == first_id
+        if not (is_first | missing).all():
+            logger.warning("The data frame contains more than one subject ID. Only subject %s was used.", first_id)
+            df = df[is_first]
+
+    g = df['gl'].to_numpy(dtype=np.float64)
+    # The time column is datetime at this point, so take its buffer without re-parsing
+    tr = df['time'].to_numpy(dtype='datetime64[ns]', copy=False)
 
     # Check and remove any bad time conversions from above
-    not_bad_conv = ~pd.isnull(tr) # double negative means these were NOT bad conversions
+    not_bad_conv = ~np.isnat(tr) # double negative means these were NOT bad conversions
 
     if not not_bad_conv.all():
-        print(f" When converting time column, {sum(~not_bad_conv)} rows were set to NA. Check to make sure the time zone is correct.")
-        g = g[~not_bad_conv]
-        tr = tr[~not_bad_conv]
+        logger.warning("When converting time column, %d rows were set to NA. Check to make sure the time zone is correct.", np.count_nonzero(~not_bad_conv))
+        g = g[not_bad_conv]
+        tr = tr[not_bad_conv]
 
-    # Check for time sorting
-    time_diffs = np.diff(tr)/np.timedelta64(1, 'm')
+    # Work on the times as int64 nanoseconds while sorting and de-duplicating
+    tr_ns = tr.view('i8')
+
+    # A single minimum tells both whether the times need sorting and whether any repeat
+    diffs_ns = np.diff(tr_ns)
+    tmin = diffs_ns.min() if len(diffs_ns) > 0 else 1
 
-    if (time_diffs < 0).any():
-        print(f"The times for subject {df['id'].iloc[0]} are not in increasing order. Sorting automatically.")
-        sorted_indx = np.argsort(tr)
-        tr = tr[sorted_indx]
+    # Check for time sorting
+    if tmin < 0:
+        logger.warning("The times for subject %s are not in increasing order. Sorting automatically.", df['id'].iloc[0])
+        sorted_indx = np.argsort(tr_ns, kind='stable')
+        tr_ns = tr_ns[sorted_indx]
         g = g[sorted_indx]
-        time_diffs = np.diff(tr)/np.timedelta64(1, 'm')
+        diffs_ns = np.diff(tr_ns)
+        tmin = diffs_ns.min()
+
+    if tmin == 0:
+        logger.warning("Subject %s has repeated glucose measurements. Only the last repeated value is used.", df['id'].iloc[0])
+        # Search the reversed times so that the index found for each repeat is its last occurrence
+        tr_ns, rev_indx = np.unique(tr_ns[::-1], return_index=True)
+        g = g[len(g) - 1 - rev_indx]
+        diffs_ns = np.diff(tr_ns)
 
-    if (time_diffs == 0).any():
-        print(f"Subject {df['id'].iloc[0]} has repeated glucose measurements. Only the last repeated value is used.")
-        _, unique_indx = np.unique(tr, return_index=True)
-        tr = tr[sorted(unique_indx)]
-        g = g[sorted(unique_indx)]
-        time_diffs = np.diff(tr)/np.timedelta64(1, 'm')
+    time_diffs = diffs_ns * (1.0 / 60e9)
 
-    # Calculate dt0 if it is not given
+    # Calculate dt0 if it is not given (time_diffs has no NaNs after the cleaning above)
     if dt0 is None:
-        dt0 = round(np.nanmedian(time_diffs))
+        dt0 = int(round(np.median(time_diffs)))
     if dt0 > inter_gap:
         raise ValueError(f"Identified measurements, {dt0} > {inter_gap} minutes apart.")
 
@@ -79,34 +110,46 @@ def cgms2daybyday(df: pd.DataFrame, dt0=None, inter_gap=45, tz="UTC")->Tuple[np.
             dt0 += (5-remainder) if remainder > 2 else -remainder
 
     # Create grid for matrix
-    ndays = int(np.ceil((tr[-1]-tr[0]).total_seconds()/86400))+1
-    dti = pd.to_timedelta(np.arange(0, ndays*24*60, dt0), unit='m')
-    # dti_cum = np.cumsum(dti)
-    mind = tr.min().replace(hour=0, minute=0, second=0)
-    time_out = mind + dti
-    print(f"The time_out is {time_out}")
+    day_ns = 86_400_000_000_000
+    ndays = int(np.ceil((tr_ns[-1] - tr_ns[0]) / day_ns)) + 1
+    # Each day must hold a whole number of grid points
+    ncols = int(round(1440 / dt0)) if dt0 > 0 else 0
+    if ncols == 0 or not np.isclose(ncols * dt0, 1440):
+        raise ValueError(f"dt0 = {dt0} minutes does not divide a day into a whole number of grid points.")
+
+    # Grid times as int64 nanoseconds, starting at midnight of the first measurement
+    mind_ns = tr_ns[0] - tr_ns[0] % day_ns
+    # Round the step to whole nanoseconds so fractional dt0 (e.g. 2.5 or 0.5 min) stays exact in int64
+    step_ns = int(round(dt0 * 60_000_000_000))
+    if ncols * step_ns != day_ns:
+        raise ValueError(f"dt0 = {dt0} minutes does not divide a day into a whole number of grid points.")
+    out_num = mind_ns + np.arange(ndays * ncols, dtype=np.int64) * step_ns
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("The time_out is %s", pd.DatetimeIndex(out_num.view('datetime64[ns]')))
 
     #Interpolate
-    df_interp = pd.DataFrame({'time': tr, 'glucose': g}).dropna()
+    not_na = ~np.isnan(g)
     interp = np.interp(
-        x = pd.to_numeric(time_out),
-        xp = pd.to_numeric(df_interp['time']),
-        fp = pd.to_numeric(df_interp['glucose'])
+        x = out_num,
+        xp = tr_ns[not_na],
+        fp = g[not_na]
     )
-    new = pd.DataFrame({'time': time_out, 'glucose': interp})
 
     # Handle large time gaps (can't interpolate over large time gaps)
     gap_start = np.where(time_diffs > inter_gap)[0]
     ngaps = len(gap_start)
 
     if ngaps > 0:
-        for idx in range(ngaps):
-            time_covered = (new['time'] > tr[gap_start[idx]]) & (new['time'] < tr[gap_start[idx] + 1])
-            new.loc[time_covered, 'glucose'] = np.nan
-
-
-    # Reshape data to days
-    gd2d = interp.reshape((ndays,-1))
-    actual_dates = pd.date_range(start=mind.normalize(), periods=ndays, freq='D')
-
-    return [gd2d, actual_dates, dt0]
\ No newline at end of file
+        # Grid points strictly inside each gap lie between these two positions
+        lo = np.searchsorted(out_num, tr_ns[gap_start], side='right')
+        hi = np.searchsorted(out_num, tr_ns[gap_start + 1], side='left')
+        delta = np.zeros(len(interp) + 1, dtype=np.int64)
+        np.add.at(delta, lo, 1)
+        np.add.at(delta, hi, -1)
+        interp[np.cumsum(delta[:-1]).astype(bool)] = np.nan
+
+    # Reshape data to days; interp is contiguous, so this is a view rather than a copy
+    gd2d = interp.reshape((ndays, ncols))
+    actual_dates = pd.DatetimeIndex((mind_ns + np.arange(ndays, dtype=np.int64) * day_ns).view('datetime64[ns]'), freq='D')
+
+    return (gd2d, actual_dates, dt0)
\ No newline at end of file
@@ -1,3 +1,4 @@
+import json
 import pytest
 import pandas as pd
 from scipy import stats
@@ -61,3 +62,117 @@ def test_cgm_measure_extraction(function_name, output_name, kwargs):
         computed_values.equals(expected_values)
         or (abs(computed_values - expected_values) < 1e-1).all()
     ), f"Mismatch in {output_name} for {function_name}"
+
+
+def test_summary_matches_individual_measures():
+    """
+    The combined summary should agree with each of the individual measure functions.
+    """
+    df = pd.read_csv("tests/data/cgm.csv")
+    result = measures.summary(df).set_index("id").sort_index()
+
+    for function_name in ["sd_glu", "cv_glu", "range_glu", "iqr_glu", "j_index", "above_percent", "quantile_glu"]:
+        expected = getattr(measures, function_name)(df).set_index("id").sort_index()
+        for column in expected.columns:
+            assert (
+                abs(result[column] - expected[column]) < 1e-8
+            ).all(), f"Mismatch in {column} between summary and {function_name}"
+
+
+def test_quantile_strategies_agree():
+    """
+    The sort-based and partition-based quantile helpers should return the same values.
+    """
+    df = pd.read_csv("tests/data/cgm.csv")
+    probs = [0, 0.1, 0.25, 0.5, 0.75, 1]
+
+    groups = measures._get_groups(df)
+    sorted_ids, sorted_values = measures._sorted_quantiles(df, groups, probs)
+    partitioned_ids, partitioned_values = measures._partitioned_quantiles(df, groups, probs)
+
+    assert list(sorted_ids) == list(partitioned_ids)
+    assert (abs(sorted_values - partitioned_values) < 1e-8).all()
+
+
+def test_in_place_id_changes_are_reflected():
+    """
+    Changing subject IDs in place between calls should change the results, in agreement with groupby.
+    """
+    df = pd.DataFrame({"id": ["a", "a", "b", "b"], "gl": [100.0, 200.0, 150.0, 300.0]})
+    assert measures.above_percent(df, [140])["above_140"].tolist() == [50.0, 100.0]
+
+    df.loc[1, "id"] = "b"
+
+    assert measures.above_percent(df, [140])["above_140"].tolist() == [0.0, 100.0]
+    assert measures.iqr_glu(df)["IQR"].tolist() == [0.0, 75.0]
+    assert measures.summary(df)["SD"].tolist() == measures.sd_glu(df)["SD"].tolist()
+
+
+def test_missing_ids_are_dropped():
+    """
+    Rows without a subject ID should be ignored, as groupby does, rather than raising.
+    """
+    df = pd.read_csv("tests/data/cgm.csv")
+    with_missing = df.copy()
+    with_missing.loc[[0, 5000, 20000], "id"] = None
+
+    for function_name in ["above_percent", "iqr_glu", "quantile_glu", "summary"]:
+        func = getattr(measures, function_name)
+        expected = func(df.drop(index=[0, 5000, 20000])).set_index("id").sort_index()
+        result = func(with_missing).set_index("id").sort_index()
+
+        assert list(result.index) == list(expected.index), f"Subject ID mismatch in {function_name}"
+        assert (abs(result - expected) < 1e-8).all().all(), f"Mismatch in {function_name}"
+
+    # Both quantile strategies must skip the missing ids
+    groups = measures._get_groups(with_missing)
+    sorted_ids, sorted_values = measures._sorted_quantiles(with_missing, groups, [0.25, 0.75])
+    partitioned_ids, partitioned_values = measures._partitioned_quantiles(with_missing, groups, [0.25, 0.75])
+    assert list(sorted_ids) == list(partitioned_ids)
+    assert (abs(sorted_values - partitioned_values) < 1e-8).all()
+
+
+def test_measures_leave_attrs_serializable():
+    """
+    Measure calls must not store anything on the caller's DataFrame (e.g. to_parquet dumps attrs to JSON).
+    """
+    df = pd.read_csv("tests/data/cgm.csv")
+    df.attrs["source"] = "cgm.csv"
+
+    measures.summary(df)
+
+    assert df.attrs == {"source": "cgm.csv"}
+    json.dumps(df.attrs)
+
+
+def test_results_are_sorted_by_id():
+    """
+    Measures should return subjects sorted by ID regardless of the input row order.
+    """
+    df = pd.read_csv("tests/data/cgm.csv").sample(frac=1, random_state=0)
+    expected_ids = sorted(df["id"].unique())
+
+    for function_name in ["above_percent", "cv_glu", "sd_glu", "mad_glu", "iqr_glu", "range_glu", "quantile_glu", "j_index", "summary"]:
+        result = getattr(measures, function_name)(df)
+        assert list(result["id"]) == expected_ids, f"Rows of {function_name} are not sorted by id"
+        assert list(result.index) == list(range(len(result))), f"Index of {function_name} is not reset"
+
+
+def test_mad_glu_rejects_unknown_scale():
+    """
+    Only 'normal' is accepted as a string scale, as in scipy.stats.median_abs_deviation.
+    """
+    df = pd.read_csv("tests/data/cgm.csv")
+
+    with pytest.raises(ValueError):
+        measures.mad_glu(df, scale="foo")
+
+
+def test_above_percent_missing_value_denominator():
+    """
+    NaN readings count towards a subject's total, while pd.NA readings in nullable columns do not.
+    """
+    df = pd.DataFrame({"id": [1, 1, 1, 1], "gl": [100.0, 200.0, 300.0, None]})
+
+    assert measures.above_percent(df, [150])["above_150"].tolist() == [50.0]
+    assert measures.above_percent(df.astype({"gl": "Float64"}), [150])["above_150"].tolist() == [pytest.approx(200 / 3)]
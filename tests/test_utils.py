@@ -0,0 +1,127 @@
+import pytest
+import numpy as np
+import pandas as pd
+from src.cgmquantify import utils
+
+
+def test_cgms2daybyday_leaves_gaps_uninterpolated():
+    """
+    Grid points inside a gap longer than inter_gap should be NaN in the returned matrix.
+    """
+    df = pd.read_csv("tests/data/cgm.csv")
+    df = df[df["id"] == "subject 1"].reset_index(drop=True)
+
+    # Remove five hours of readings to create a gap well above inter_gap
+    gap_start, gap_end = pd.Timestamp(df["time"].iloc[500]), pd.Timestamp(df["time"].iloc[560])
+    df = df.drop(index=range(501, 560))
+
+    gd2d, actual_dates, dt0 = utils.cgms2daybyday(df)
+
+    grid = actual_dates[0] + pd.to_timedelta(np.arange(gd2d.size) * dt0, unit="m")
+    inside = (grid > gap_start) & (grid < gap_end)
+    assert inside.any()
+    assert np.isnan(gd2d.ravel()[inside]).all()
+
+
+def test_cgms2daybyday_keeps_last_repeated_measurement():
+    """
+    When a timestamp is repeated, the last glucose value recorded for it should be used.
+    """
+    df = pd.read_csv("tests/data/cgm.csv")
+    df = df[df["id"] == "subject 1"].reset_index(drop=True)
+    repeated = df.iloc[[100]].assign(gl=999.0)
+    df = pd.concat([df.iloc[:101], repeated, df.iloc[101:]], ignore_index=True)
+
+    gd2d, _, _ = utils.cgms2daybyday(df)
+
+    assert np.nanmax(gd2d) > 400
+
+
+def test_cgms2daybyday_accepts_whole_number_float_dt0():
+    """
+    A whole-number float dt0 should behave like the equivalent integer.
+    """
+    df = pd.read_csv("tests/data/cgm.csv")
+    df = df[df["id"] == "subject 1"]
+
+    gd2d, _, dt0 = utils.cgms2daybyday(df.copy(), dt0=5.0)
+    expected, _, _ = utils.cgms2daybyday(df.copy(), dt0=5)
+
+    assert gd2d.shape == (11, 288)
+    assert dt0 == 5.0
+    assert np.array_equal(gd2d, expected, equal_nan=True)
+
+
+def test_cgms2daybyday_supports_fractional_dt0():
+    """
+    A fractional dt0 that divides a day evenly should give a grid with that spacing.
+    """
+    df = pd.read_csv("tests/data/cgm.csv")
+    df = df[df["id"] == "subject 1"]
+
+    gd2d, actual_dates, dt0 = utils.cgms2daybyday(df.copy(), dt0=2.5)
+
+    assert gd2d.shape == (11, 576)
+    assert dt0 == 2.5
+
+    # Values should match interpolation on an exact 150-second grid
+    times = pd.to_datetime(df["time"]).to_numpy(dtype="datetime64[ns]").view("i8")
+    grid = actual_dates[0].value + np.arange(gd2d.size, dtype=np.int64) * 150_000_000_000
+    expected = np.interp(grid, times, df["gl"].to_numpy())
+    observed = gd2d.ravel()
+    assert np.allclose(observed[~np.isnan(observed)], expected[~np.isnan(observed)])
+
+
+def test_cgms2daybyday_rejects_invalid_dt0():
+    """
+    A dt0 that is not a positive number of minutes should raise.
+    """
+    df = pd.read_csv("tests/data/cgm.csv")
+    df = df[df["id"] == "subject 1"]
+
+    for dt0 in [0, -5, "foo"]:
+        with pytest.raises(ValueError):
+            utils.cgms2daybyday(df.copy(), dt0=dt0)
+
+
+def test_cgms2daybyday_ignores_missing_ids_when_selecting_subject():
+    """
+    Rows with a missing ID should not be treated as a second subject.
+    """
+    df = pd.read_csv("tests/data/cgm.csv")
+    df = df[df["id"] == "subject 1"].reset_index(drop=True)
+    expected, _, _ = utils.cgms2daybyday(df.copy())
+
+    df.loc[[0, 100], "id"] = None
+    gd2d, _, _ = utils.cgms2daybyday(df)
+
+    assert np.array_equal(gd2d, expected, equal_nan=True)
+
+
+def test_cgms2daybyday_parses_iso8601_times():
+    """
+    Times with a 'T' separator do not match the default format and should fall back to ISO 8601 parsing.
+    """
+    df = pd.read_csv("tests/data/cgm.csv")
+    df = df[df["id"] == "subject 1"].copy()
+    df["time"] = df["time"].str.replace(" ", "T")
+    assert df["time"].iloc[0].startswith("2020-02-13T")
+
+    gd2d, _, _ = utils.cgms2daybyday(df)
+
+    assert gd2d.shape == (11, 288)
+    assert not np.isnan(gd2d).all()
+
+
+def test_cgms2daybyday_returns_daily_dates():
+    """
+    The returned dates should be a daily DatetimeIndex starting at midnight of the first reading.
+    """
+    df = pd.read_csv("tests/data/cgm.csv")
+    df = df[df["id"] == "subject 1"].reset_index(drop=True)
+
+    gd2d, actual_dates, dt0 = utils.cgms2daybyday(df)
+
+    assert actual_dates.freq == "D"
+    assert len(actual_dates) == gd2d.shape[0]
+    assert actual_dates[0] == pd.Timestamp(df["time"].iloc[0]).tz_localize(None).normalize()